@@ -9,6 +9,9 @@ Description: This script fetches the last 1 month of solar energy generation dat
 
 from entsoe import EntsoePandasClient
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 
 def fetch_solar_data(api_key, filename='DE_solar_energy_last_1_month.csv'):
     """
@@ -18,6 +21,12 @@ def fetch_solar_data(api_key, filename='DE_solar_energy_last_1_month.csv'):
     Args:
     api_key (str): The API key for accessing ENTSO-E data.
     filename (str): The name of the CSV file to save the data.
+
+    Returns:
+    str: The name of the CSV file the data was saved to.
+
+    Raises:
+    RuntimeError: If the data could not be fetched from ENTSO-E.
     """
     client = EntsoePandasClient(api_key=api_key)
 
@@ -25,16 +34,26 @@ def fetch_solar_data(api_key, filename='DE_solar_energy_last_1_month.csv'):
     start = end - pd.DateOffset(months=1)
     country_code = 'DE'
 
-    df = client.query_generation(country_code, start=start, end=end, psr_type='B16')
-    df_1hour = df.resample('1h').sum().reset_index()
-
-    if len(df_1hour.columns) > 2:
-        df_1hour = df_1hour.drop(df_1hour.columns[2], axis=1)
-
-    df_1hour.columns = ['datetime_Europe_Brussels', 'solar_actual_MWh']
-    df_1hour.to_csv(filename, index=False)
-
-    print(f"Data saved to {filename}")
-
-
-
+    try:
+        df = client.query_generation(country_code, start=start, end=end, psr_type='B16')
+    except Exception as e:
+        # The original error can contain the request URL with the API key, so it is only chained
+        raise RuntimeError("Failed to fetch solar generation data from ENTSO-E") from e
+
+    # Keep only the actual generation column and sum it per hour in Arrow (floored in
+    # UTC to stay unambiguous across DST changes; Brussels offsets are whole hours)
+    solar = df.iloc[:, 0]
+    readings = pa.table({
+        'datetime_Europe_Brussels': pc.floor_temporal(pa.array(solar.index.tz_convert('UTC')), unit='hour'),
+        'solar_actual_MWh': pa.array(solar.astype('float32').to_numpy(), from_pandas=True),
+    })
+    hourly = readings.group_by('datetime_Europe_Brussels').aggregate(
+        [('solar_actual_MWh', 'sum', pc.ScalarAggregateOptions(min_count=0))])
+    table_1hour = pa.table({
+        # Back to local time, at second resolution, so the written timestamps match the column name
+        'datetime_Europe_Brussels': hourly['datetime_Europe_Brussels'].cast(pa.timestamp('s', tz=str(solar.index.tz))),
+        'solar_actual_MWh': hourly['solar_actual_MWh_sum'],
+    }).sort_by('datetime_Europe_Brussels')
+    pacsv.write_csv(table_1hour, filename)
+
+    return filename
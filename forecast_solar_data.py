@@ -7,43 +7,184 @@ Description: This script fetches the last 1 month of solar energy generation dat
              for the next 14 days, and saves the forecasted results to a CSV file.
 """
 
+import functools
+import hashlib
+import os
+import tempfile
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from statsmodels.tsa.stattools import adfuller
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from statsmodels.tsa.statespace.sarimax import SARIMAX, SARIMAXResults
+from statsmodels.tsa.adfvalues import mackinnonp
 import warnings
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def read_csv(file_path: str) -> pd.DataFrame:
+# Directory where fitted SARIMAX models are persisted between runs
+MODEL_CACHE_DIR = '.sarimax_cache'
+
+# Number of fits kept in MODEL_CACHE_DIR
+MODEL_CACHE_MAX_ENTRIES = 4
+
+# Number of lagged differences in the ADF regression (one week of daily data)
+ADF_LAGS = 7
+
+# Worker threads for background CSV writes, and the pending write for each output file
+_csv_writer = ThreadPoolExecutor(max_workers=2)
+_pending_writes: Dict[str, Future] = {}
+
+def read_csv(file_path: str, index_col: Optional[str] = None,
+             usecols: Optional[List[str]] = None) -> pd.DataFrame:
     """
     Reads data from a CSV file.
 
     :param file_path: Path to the input CSV file
+    :param index_col: Column to use as the index, if any
+    :param usecols: Columns to read, or None to read every column
     :return: DataFrame containing the data
     """
+    wait_for_pending_write(file_path)
     try:
-        df = pd.read_csv(file_path, parse_dates=['datetime_Europe_Brussels'])
+        df = pd.read_csv(file_path, engine='pyarrow', parse_dates=['datetime_Europe_Brussels'],
+                         index_col=index_col, usecols=usecols)
         return df
     except Exception as e:
         logging.error(f"Error reading the CSV file: {e}")
         raise
 
-def write_to_csv(df: pd.DataFrame, output_file_path: str) -> None:
+def wait_for_pending_write(file_path: str) -> None:
+    """
+    Blocks until a background write to the given file, if any, has finished.
+    Write errors are logged by the writer; a failed write leaves the previous file in place.
+
+    :param file_path: Path to the CSV file about to be read
+    """
+    key = os.path.abspath(file_path)
+    future = _pending_writes.get(key)
+    if future is None:
+        return
+    wait([future])
+    # Only forget the write if a newer one has not been queued for the same file meanwhile
+    if _pending_writes.get(key) is future:
+        _pending_writes.pop(key, None)
+
+def write_to_csv(df: pd.DataFrame, output_file_path: str, background: bool = False) -> None:
     """
     Writes data to a CSV file.
 
     :param df: DataFrame containing the data
     :param output_file_path: Path to the output CSV file
+    :param background: Write on a worker thread and return immediately; readers wait via wait_for_pending_write
     """
+    if background:
+        wait_for_pending_write(output_file_path)  # Keep writes to the same file in order
+        _pending_writes[os.path.abspath(output_file_path)] = _csv_writer.submit(write_to_csv, df, output_file_path)
+        return
+
+    # Write to a temporary file next to the target and swap it in, so readers never see a partial file
+    tmp_path = f"{output_file_path}.{uuid.uuid4().hex}.tmp"
     try:
-        df.to_csv(output_file_path, index=False)
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # Write timestamps at second resolution so the output does not depend on the pandas time unit
+            for i, field in enumerate(table.schema):
+                if pa.types.is_timestamp(field.type):
+                    table = table.set_column(i, field.name, table.column(i).cast(pa.timestamp('s', tz=field.type.tz)))
+            pacsv.write_csv(table, tmp_path)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            # Fall back to pandas for columns Arrow cannot convert
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, output_file_path)
         logging.info(f"Forecasted data has been written to {output_file_path}")
     except Exception as e:
         logging.error(f"Error writing the CSV file: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise
 
+def _series_fingerprint(series: pd.Series, order: tuple, seasonal_order: tuple) -> str:
+    """
+    Builds a content hash for a series and the SARIMA orders fitted on it.
+
+    :param series: Time series data
+    :param order: Non-seasonal (p, d, q) order
+    :param seasonal_order: Seasonal (P, D, Q, S) order
+    :return: Hex digest identifying the fit inputs
+    """
+    digest = hashlib.sha256(series.to_numpy().tobytes())
+    digest.update(repr((order, seasonal_order)).encode())
+    return digest.hexdigest()
+
+def _prune_model_cache(cache_dir: str, max_entries: int = MODEL_CACHE_MAX_ENTRIES) -> None:
+    """
+    Removes the oldest saved fits so the model cache keeps at most max_entries of them.
+
+    :param cache_dir: Directory holding the saved model fits
+    :param max_entries: Number of most recently written fits to keep
+    """
+    saved_fits = []
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith('.pkl'):
+            continue
+        try:
+            saved_fits.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            pass  # Already pruned by another session
+    saved_fits.sort(reverse=True)
+    for _, path in saved_fits[max_entries:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def fit_sarima(series: pd.Series, order: tuple, seasonal_order: tuple,
+               cache_dir: str = MODEL_CACHE_DIR) -> SARIMAXResults:
+    """
+    Fits a SARIMA model, reusing a previously saved fit for identical inputs.
+
+    :param series: Time series data
+    :param order: Non-seasonal (p, d, q) order
+    :param seasonal_order: Seasonal (P, D, Q, S) order
+    :param cache_dir: Directory holding the saved model fits
+    :return: Fitted SARIMAX results
+    """
+    model_path = os.path.join(cache_dir, f"{_series_fingerprint(series, order, seasonal_order)}.pkl")
+    if os.path.exists(model_path):
+        logging.info(f"Loading cached SARIMA fit from {model_path}")
+        try:
+            return SARIMAXResults.load(model_path)
+        except Exception as e:
+            # Truncated or incompatible (e.g. after a statsmodels upgrade) pickles are refit
+            logging.warning(f"Discarding unreadable cached SARIMA fit {model_path}: {e}")
+            try:
+                os.remove(model_path)
+            except FileNotFoundError:
+                pass
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore")  # Ignore warnings during SARIMA fitting
+        model = SARIMAX(series, order=order, seasonal_order=seasonal_order)
+        model_fit = model.fit(method='lbfgs', maxiter=50, disp=False)
+
+    # Save to a temporary file first so an interrupted save never leaves a partial pickle
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        model_fit.save(tmp_path)
+        os.replace(tmp_path, model_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    _prune_model_cache(cache_dir)
+    return model_fit
+
 def sarima_forecast(df: pd.DataFrame, forecast_column: str, best_p: int, best_d: int, best_q: int,
                     best_P: int, best_D: int, best_Q: int, best_S: int, forecast_periods: int) -> pd.Series:
     """
@@ -62,17 +203,56 @@ def sarima_forecast(df: pd.DataFrame, forecast_column: str, best_p: int, best_d:
     :return: Series containing the forecasted values
     """
     try:
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore")  # Ignore warnings during SARIMA fitting
-            model = SARIMAX(df[forecast_column], order=(best_p, best_d, best_q),
-                            seasonal_order=(best_P, best_D, best_Q, best_S))
-            model_fit = model.fit(disp=False)
-            forecast = model_fit.predict(start=len(df), end=len(df) + forecast_periods - 1, dynamic=False)
+        model_fit = fit_sarima(df[forecast_column], (best_p, best_d, best_q), (best_P, best_D, best_Q, best_S))
+        forecast = model_fit.predict(start=len(df), end=len(df) + forecast_periods - 1, dynamic=False)
         return forecast
     except Exception as e:
         logging.error(f"Error during SARIMA forecasting: {e}")
         raise
 
+def fill_negative_values(forecast: pd.Series) -> pd.Series:
+    """
+    Replaces negative or non-finite forecast values with the last valid value before them.
+
+    :param forecast: Series containing the forecasted values
+    :return: Series with invalid values forward-filled (leading invalid values become 0)
+    """
+    return forecast.where(np.isfinite(forecast) & (forecast >= 0)).ffill().fillna(0)
+
+def adf_pvalue(values: np.ndarray, lags: int = ADF_LAGS) -> float:
+    """
+    Computes the Augmented Dickey-Fuller p-value (constant, fixed lag order) with a single OLS solve.
+
+    :param values: Time series values without missing data
+    :param lags: Number of lagged differences included in the regression
+    :return: MacKinnon approximate p-value of the test statistic
+    """
+    values = np.asarray(values, dtype=np.float64)
+    diff = np.diff(values)
+    target = diff[lags:]
+    nobs = target.size
+    # Regressors: lagged level, constant and the lagged differences
+    design = np.column_stack([values[lags:lags + nobs], np.ones(nobs)] +
+                             [diff[lags - i:lags - i + nobs] for i in range(1, lags + 1)])
+    if nobs <= design.shape[1]:
+        raise ValueError(f"Not enough observations ({values.size}) for an ADF test with {lags} lags")
+
+    coef, _, _, _ = np.linalg.lstsq(design, target, rcond=None)
+    resid = target - design @ coef
+    sigma2 = resid @ resid / (nobs - design.shape[1])
+    stderr = np.sqrt(sigma2 * np.linalg.inv(design.T @ design)[0, 0])
+    return mackinnonp(coef[0] / stderr, regression='c', N=1)
+
+@functools.lru_cache(maxsize=8)
+def _is_stationary(values: bytes) -> bool:
+    """
+    Runs the ADF test on raw float64 values, memoized so unchanged data is not retested.
+
+    :param values: Bytes of a float64 array without missing data
+    :return: Boolean indicating whether the series is stationary
+    """
+    return adf_pvalue(np.frombuffer(values, dtype=np.float64)) <= 0.05  # p-value less than 0.05 indicates stationarity
+
 def check_stationarity(timeseries: pd.Series) -> bool:
     """
     Checks the stationarity of the time series using Augmented Dickey-Fuller test.
@@ -80,10 +260,10 @@ def check_stationarity(timeseries: pd.Series) -> bool:
     :param timeseries: Time series data
     :return: Boolean indicating whether the series is stationary
     """
-    result = adfuller(timeseries.dropna())
-    return result[1] <= 0.05  # p-value less than 0.05 indicates stationarity
+    return _is_stationary(timeseries.dropna().to_numpy(dtype=np.float64).tobytes())
 
-def forecast_solar_data(input_file_path: str, output_file_path: str, forecast_column: str, unit: str) -> None:
+def forecast_solar_data(input_file_path: str, output_file_path: str, forecast_column: str, unit: str,
+                        background_write: bool = False) -> None:
     """
     Function to read data, resample to daily intervals, perform SARIMA forecasting for the next 14 days, and write results to a CSV file.
 
@@ -91,14 +271,16 @@ def forecast_solar_data(input_file_path: str, output_file_path: str, forecast_co
     :param output_file_path: Path to the output CSV file
     :param forecast_column: Column name for the forecast data
     :param unit: Unit of the forecasted values
+    :param background_write: Return before the output CSV has been flushed to disk
     """
     # Read data from CSV
-    df = read_csv(input_file_path)
+    df = read_csv(input_file_path, index_col='datetime_Europe_Brussels',
+                  usecols=['datetime_Europe_Brussels', forecast_column])
+    df[forecast_column] = df[forecast_column].astype(np.float32)
     logging.info(f"Column names: {df.columns}")
 
-    # Set datetime column as index and convert to UTC
-    df['datetime_Europe_Brussels'] = pd.to_datetime(df['datetime_Europe_Brussels'], utc=True)
-    df.set_index('datetime_Europe_Brussels', inplace=True)
+    # Convert the datetime index to UTC
+    df.index = pd.to_datetime(df.index, format='ISO8601', utc=True, cache=True)
     logging.info(f"Index type: {type(df.index)}")
 
     # Filter the last 1 month of data
@@ -119,17 +301,15 @@ def forecast_solar_data(input_file_path: str, output_file_path: str, forecast_co
     forecast = sarima_forecast(df, forecast_column, best_p, best_d, best_q, best_P, best_D, best_Q, best_S, forecast_periods)
 
     # Replace negative forecast values with the previous day's value
-    for i in range(1, len(forecast)):
-        if forecast[i] < 0:
-            forecast[i] = forecast[i - 1]
+    forecast = fill_negative_values(forecast)
 
     # Create a DataFrame for the forecast results
     forecast_dates = pd.date_range(start=df.index[-1] + pd.Timedelta(days=1), periods=forecast_periods, freq='D')
-    forecast_df = pd.DataFrame({'datetime_Europe_Brussels': forecast_dates, 'Forecast': forecast})
+    forecast_df = pd.DataFrame({'datetime_Europe_Brussels': forecast_dates, f'Forecast ({unit})': forecast.to_numpy()},
+                               copy=False)
 
     # Write forecast data to a new CSV file
-    forecast_df.columns = ['datetime_Europe_Brussels', f'Forecast ({unit})']
-    write_to_csv(forecast_df, output_file_path)
+    write_to_csv(forecast_df, output_file_path, background=background_write)
 
 if __name__ == "__main__":
     input_file_path = 'DE_solar_energy_last_1_month.csv'  # Source CSV file
@@ -4,47 +4,70 @@ Version: 1.0
 Date: 2024-07-04
 Description: This script creates a Streamlit dashboard to fetch and forecast solar energy generation data for the next 14 days.
 """
+import logging
 import streamlit as st
+from streamlit.errors import StreamlitSecretNotFoundError
 import pandas as pd
-import altair as alt
+import numpy as np
+import os
 from datetime import datetime
 from fetch_solar_data import fetch_solar_data  # Import the fetch function
-from forecast_solar_data import forecast_solar_data  # Import the forecast function
+from forecast_solar_data import forecast_solar_data, wait_for_pending_write  # Import the forecast functions
 
 # Title and description
 st.title('Next 14-Day Germany Solar Energy Forecast')
 st.write('This dashboard shows the forecast of solar energy generation for the next 14 days in MWh.')
 
-# Load data
-@st.cache_resource
-def load_data(file_path):
-    data = pd.read_csv(file_path)
-    data['datetime_Europe_Brussels'] = pd.to_datetime(data['datetime_Europe_Brussels'])
+# Load data (the file's modification time is part of the cache key so updated CSVs are re-read)
+@st.cache_data(ttl=600, max_entries=4)
+def load_data(file_path, mtime):
+    data = pd.read_csv(file_path, engine='pyarrow', index_col='datetime_Europe_Brussels',
+                       usecols=['datetime_Europe_Brussels', 'Forecast (MWh)'])
+    data['Forecast (MWh)'] = data['Forecast (MWh)'].astype(np.float32)
+    data.index = pd.to_datetime(data.index, format='ISO8601', utc=True, cache=True)
     return data
 
+# Fetch solar data; outcomes (including failures) are cached briefly so repeated clicks during an outage don't retry the API
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_data(api_key):
+    try:
+        return fetch_solar_data(api_key)
+    except RuntimeError:
+        # Keep the details (which may include the API key) in the server log only; only None is cached
+        logging.exception("Fetching solar data failed")
+        return None
+
 # Function to fetch and save solar data
 def fetch_and_forecast_solar_data():
-    api_key = st.secrets["api_key"]
-    fetch_solar_data(api_key)
-    forecast_solar_data('DE_solar_energy_last_1_month.csv', 'forecasted_solar_energy.csv', 'solar_actual_MWh', 'MWh')
+    try:
+        api_key = st.secrets["api_key"]
+    except (StreamlitSecretNotFoundError, FileNotFoundError, KeyError):
+        api_key = None
+    if not api_key:
+        st.error("No ENTSO-E API key configured. Add api_key to the Streamlit secrets.")
+        return
+
+    with st.spinner('Updating solar data and forecast...'):
+        data_file_path = fetch_data(api_key)
+        if data_file_path is None:
+            st.error("Could not update the solar data from ENTSO-E. Please try again later.")
+            return
+        load_data.clear()  # Drop frames parsed from the files about to be replaced
+        forecast_solar_data(data_file_path, 'forecasted_solar_energy.csv', 'solar_actual_MWh', 'MWh',
+                            background_write=True)
     st.session_state['fetch_date'] = datetime.now()
 
 # File path for forecast data
 forecast_file_path = 'forecasted_solar_energy.csv'
 
-# Load forecast data
-forecast_data = load_data(forecast_file_path)
-
-# Plotting the forecast data
-chart = alt.Chart(forecast_data).mark_bar().encode(
-    x='datetime_Europe_Brussels:T',
-    y='Forecast (MWh):Q',
-    tooltip=['datetime_Europe_Brussels', 'Forecast (MWh)']
-).properties(
-    title='14-Day Germany Solar Energy Forecast'
-)
+# Load forecast data (waiting for a background write from a previous update, if any)
+wait_for_pending_write(forecast_file_path)
+forecast_data = load_data(forecast_file_path, os.path.getmtime(forecast_file_path))
 
-st.altair_chart(chart, use_container_width=True)
+# Plotting the forecast data (only the plotted column is sent to the browser)
+chart_data = forecast_data['Forecast (MWh)'].tail(14)
+st.subheader('14-Day Germany Solar Energy Forecast')
+st.bar_chart(chart_data)
 
 # Button to fetch the solar data and update forecast
 if st.button('Update Data'):